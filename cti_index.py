@@ -0,0 +1,62 @@
+from stix2.utils import parse_into_datetime
+from bisect import bisect_left, bisect_right
+
+'''
+Sorted time indexes over a STIX source
+
+index = TimeIndex(fs)
+index.since("2018-10-01T00:14:20.652Z", 'modified', 'attack-pattern')
+
+The source is scanned once, after that range queries on created and modified
+are answered by binary search instead of a full scan per call.
+'''
+
+TIME_FIELDS = ('created', 'modified')
+
+
+class TimeIndex:
+    """
+    Keeps every object of a source sorted by its created and modified timestamps,
+    once for all objects and once per STIX type.
+    It does not follow the source, build a new one after the content is updated.
+    """
+    
+    def __init__(self, src):
+        
+        self._keys = {}
+        self._objects = {}
+        
+        objects = src.query()
+        for field in TIME_FIELDS:
+            entries = {}
+            for obj in objects:
+                timestamp = obj.get(field)
+                if timestamp is None:
+                    continue
+                timestamp = parse_into_datetime(timestamp)
+                entries.setdefault(None, []).append((timestamp, obj))
+                entries.setdefault(obj['type'], []).append((timestamp, obj))
+            
+            for typ, pairs in entries.items():
+                pairs.sort(key=lambda pair: pair[0])
+                self._keys[field, typ] = [pair[0] for pair in pairs]
+                self._objects[field, typ] = [pair[1] for pair in pairs]
+    
+    def between(self, start, end, field='modified', typ=None):
+        """objects whose field is in (start, end], start or end may be None for an open range"""
+        keys = self._keys.get((field, typ), [])
+        lo = 0 if start is None else bisect_right(keys, parse_into_datetime(start))
+        hi = len(keys) if end is None else bisect_right(keys, parse_into_datetime(end))
+        return self._objects.get((field, typ), [])[lo:hi]
+    
+    def since(self, timestamp, field='modified', typ=None):
+        return self.between(timestamp, None, field, typ)
+    
+    def until(self, timestamp, field='modified', typ=None):
+        """objects whose field is strictly before the timestamp"""
+        keys = self._keys.get((field, typ), [])
+        return self._objects.get((field, typ), [])[:bisect_left(keys, parse_into_datetime(timestamp))]
+    
+    def latest(self, field='modified', typ=None):
+        keys = self._keys.get((field, typ))
+        return keys[-1] if keys else None
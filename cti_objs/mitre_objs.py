@@ -71,6 +71,19 @@ class Technique(SDO):
         graph.merge(my_node, self._type, 'name')
         
         return my_node
+    
+    def properties(self):
+        
+        properties = super().properties()
+        properties['requirements'] = self._requirements
+        properties['network'] = self._network
+        properties['remote'] = self._remote
+        properties['platform'] = self._platform
+        properties['permission_required'] = self._permission
+        properties['effective_permission'] = self._effective
+        properties['defense_bypassed'] = self._bypass
+        
+        return properties
 
 
 class Software(SDO):
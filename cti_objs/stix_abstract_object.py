@@ -57,19 +57,22 @@ class SDO:
     
     def store(self, graph, node):
         print('INSERT SDO', self._type, 'Name:', self._name)
-        my_node = Node(
-                self._type,
-                name=self._name,
-                mitre_id=self._mitre_id,
-                description=self._description,
-                deprecated=self._deprecated,
-                revoked=self._revoked,
-                old_id=self._old_id
-            )
+        my_node = Node(self._type, **self.properties())
         graph.merge(my_node, self._type, 'name')
         self.create_sro().store(graph, my_node, node)
         return my_node
     
+    def properties(self):
+        """the node properties of this SDO, subclasses extend it with their own fields"""
+        return {
+            'name': self._name,
+            'mitre_id': self._mitre_id,
+            'description': self._description,
+            'deprecated': self._deprecated,
+            'revoked': self._revoked,
+            'old_id': self._old_id
+        }
+    
     @property
     def used_by(self):
         return self._used_by
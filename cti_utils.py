@@ -73,22 +73,31 @@ def get_techniques_by_content(src, content):
     ]
 
 
-def get_techniques_since_time(src, timestamp):
+def get_techniques_since_time(src, timestamp, index=None):
     """
-    Get Techniques added since a certain time
+    Get Techniques added or changed since a certain time
 
     get_techniques_since_time(src, "2018-10-01T00:14:20.652Z")
+    get_techniques_since_time(src, "2018-10-01T00:14:20.652Z", TimeIndex(src))
 
     This example shows how you can use the Filter API
     to only get techniques that have been added to the STIX content
-    since a certain time based on the created timestamp.
+    since a certain time.
+    The modified timestamp is never before the created one,
+    so filtering on modified returns new techniques as well as changed ones.
     This code could be used within a larger function or script
     to alert when a new technique has been added to the ATT&CK STIX/TAXII content.
     The type could also be changed (or removed completely) to return results for different objects.
+    When polling often, pass a TimeIndex of the source so the query is a binary search instead of a full scan.
+    The index is a snapshot of the source when it was built: rebuild it after every db_update,
+    or new and changed techniques will not show up.
     """
+    if index is not None:
+        return index.since(timestamp, 'modified', 'attack-pattern')
+    
     filt = [
         Filter('type', '=', 'attack-pattern'),
-        Filter('created', '>', timestamp)
+        Filter('modified', '>', timestamp)
     ]
     return src.query(filt)
 
@@ -109,6 +118,23 @@ def get_object_by_attack_id(src, typ, attack_id):
     return src.query(filt)
 
 
+def get_attack_id(obj):
+    """
+    Get the ATT&CK ID of an object
+
+    get_attack_id(technique)
+
+    The ID is the external_id of the ATT&CK reference, whose source_name depends on the matrix:
+    mitre-attack, mitre-pre-attack or mitre-mobile-attack.
+    Objects of one matrix can also be shipped with another (Twitoor is in enterprise
+    with a mitre-mobile-attack reference), so any of them is accepted.
+    """
+    for reference in obj.get('external_references', []):
+        if reference.get('source_name', '').startswith('mitre-') and 'external_id' in reference:
+            return reference['external_id']
+    return None
+
+
 def get_group_by_alias(src, alias):
     """
     Get Group by alias
@@ -0,0 +1,120 @@
+from cti_objs.stix_abstract_object import SDO
+from cti_utils import get_attack_id
+from stix2 import Filter
+from stix2.utils import format_datetime, parse_into_datetime
+from py2neo import Node, Subgraph
+from datetime import datetime, timezone
+
+'''
+Change feed of the imports.
+
+Each db_init run appends one (:import_run) node and one (:change) node per object
+added, modified or revoked since the state recorded in the (:feed_object) nodes.
+Changes carry a global, increasing seq, so a consumer only keeps the last seq it has seen and pages from there:
+
+changes = get_change_feed(graph, after=last_seq, limit=100)
+'''
+
+FEED_TYPES = [
+    'x-mitre-matrix',
+    'x-mitre-tactic',
+    'attack-pattern',
+    'malware',
+    'tool',
+    'intrusion-set',
+    'course-of-action'
+]
+
+
+def write_change_feed(graph, sources):
+    """
+    version 1.3 record what an import run changed
+
+    sources are the data sources of every imported matrix.
+    ATT&CK modified timestamps do not grow from release to release, so no timestamp cutoff is used:
+    the modified and revoked values of every object are kept in (:feed_object) nodes
+    and each run is diffed against the values the previous runs left there.
+    """
+    for label, prop in [('change', 'seq'), ('import_run', 'run'), ('feed_object', 'stix_id')]:
+        if (prop,) not in graph.schema.get_indexes(label):
+            graph.schema.create_index(label, prop)
+    
+    last = graph.run('MATCH (r:import_run) RETURN r ORDER BY r.run DESC LIMIT 1').evaluate()
+    run = 0 if last is None else last['run'] + 1
+    seq = 0 if last is None else last['last_seq']
+    
+    known = {record['stix_id']: (record['modified'], record['revoked']) for record in graph.run(
+        'MATCH (o:feed_object) RETURN o.stix_id AS stix_id, o.modified AS modified, o.revoked AS revoked'
+    )}
+    
+    current = {}
+    for src in sources:
+        for typ in FEED_TYPES:
+            for obj in src.query([Filter('type', '=', typ)]):
+                current[obj['id']] = obj
+    
+    changed = []
+    for stix_id, obj in current.items():
+        modified = format_datetime(parse_into_datetime(obj['modified']))
+        revoked = bool(obj.get('revoked'))
+        if stix_id not in known:
+            changed.append(('added', modified, obj))
+        elif revoked and not known[stix_id][1]:
+            changed.append(('revoked', modified, obj))
+        elif modified != known[stix_id][0]:
+            changed.append(('modified', modified, obj))
+    
+    nodes = []
+    states = []
+    first_seq = seq + 1
+    for change, modified, obj in sorted(changed, key=lambda c: parse_into_datetime(c[1])):
+        
+        sdo = SDO(sdo_type=obj['type'], obj_dict=obj)
+        print('CHANGE', change, obj['type'], 'Name:', sdo.name)
+        seq += 1
+        nodes.append(Node(
+            'change',
+            seq=seq,
+            run=run,
+            change=change,
+            stix_id=obj['id'],
+            type=obj['type'],
+            mitre_id=get_attack_id(obj),
+            name=sdo.name,
+            created=format_datetime(parse_into_datetime(obj['created'])),
+            modified=modified
+        ))
+        states.append({'stix_id': obj['id'], 'modified': modified, 'revoked': bool(obj.get('revoked'))})
+    
+    nodes.append(Node(
+        'import_run',
+        run=run,
+        date=format_datetime(datetime.now(timezone.utc)),
+        first_seq=first_seq,
+        last_seq=seq
+    ))
+    tx = graph.begin()
+    tx.create(Subgraph(nodes))
+    tx.run(
+        'UNWIND $states AS state MERGE (o:feed_object {stix_id: state.stix_id}) '
+        'SET o.modified = state.modified, o.revoked = state.revoked',
+        states=states
+    )
+    tx.commit()
+    print(seq - first_seq + 1, 'changes recorded.')
+
+
+def get_change_feed(src, after=0, limit=100):
+    """
+    Get the changes after a seq, oldest first
+
+    get_change_feed(graph, after=0, limit=100)
+
+    The seq index makes every page a range lookup, pass the seq of the
+    last change of a page as after to fetch the next one.
+    """
+    cursor = src.run(
+        'MATCH (c:change) WHERE c.seq > $after RETURN c ORDER BY c.seq LIMIT $limit',
+        after=after, limit=limit
+    )
+    return [record['c'] for record in cursor]
@@ -0,0 +1,313 @@
+from cti_objs.mitre_objs import *
+from cti_utils import get_attack_id
+from db_init import graph
+from hashlib import sha1
+from datetime import datetime
+from py2neo import Node, Relationship
+import json
+import git
+
+'''
+Multi-release ATT&CK history.
+
+Every release (a git tag or commit of the cti repository) is stored as validity intervals
+instead of a full copy of the graph:
+
+    (:stix_object {stix_id, type})-[:version]->(:stix_version {valid_from, valid_to, digest, ...})
+    (:stix_object)-[:uses|mitigates|in|... {stix_id, valid_from, valid_to, digest}]->(:stix_object)
+
+valid_from and valid_to are release ordinals (see the :release nodes), valid_to is exclusive
+and stays null while the version is still current.
+A new interval is only opened when the content digest of an object or a relationship changes.
+
+history_init(working_dir)
+get_object_as_of(graph, 'technique', 'T1085', 'v6.0')
+'''
+
+MATRICES = ['enterprise-attack', 'pre-attack', 'mobile-attack']
+
+SDO_CLASSES = {
+    'x-mitre-matrix': lambda obj: Matrix(obj_dict=obj),
+    'x-mitre-tactic': lambda obj: Tactic(obj_dict=obj, used_by=None),
+    'attack-pattern': lambda obj: Technique(obj_dict=obj, used_by=None),
+    'malware': lambda obj: Software(obj_dict=obj, used_by=None),
+    'tool': lambda obj: Software(obj_dict=obj, used_by=None),
+    'intrusion-set': lambda obj: Group(obj_dict=obj, used_by=None),
+    'course-of-action': lambda obj: Mitigation(obj_dict=obj, used_by=None)
+}
+
+
+def create_history_indexes():
+    """index the properties used to look up objects, versions and releases"""
+    for label, *props in [
+        ('stix_object', 'stix_id'),
+        ('stix_object', 'type', 'mitre_id'),
+        ('stix_version', 'valid_from'),
+        ('release', 'tag'),
+    ]:
+        if tuple(props) not in graph.schema.get_indexes(label):
+            graph.schema.create_index(label, *props)
+
+
+def digest(obj):
+    return sha1(json.dumps(obj, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def read_release(commit):
+    """read the STIX objects of each matrix of a commit straight from the git tree, without a checkout"""
+    matrices = {}
+    for matrix in MATRICES:
+        try:
+            tree = commit.tree / matrix
+        except KeyError:
+            continue
+        objects = {}
+        for blob in tree.traverse():
+            if blob.type != 'blob' or not blob.path.endswith('.json'):
+                continue
+            bundle = json.loads(blob.data_stream.read().decode('utf-8'))
+            for obj in bundle.get('objects', []):
+                if obj['type'] in SDO_CLASSES or obj['type'] == 'relationship':
+                    objects[obj['id']] = obj
+        matrices[matrix] = objects
+    return matrices
+
+
+def release_edges(objects):
+    """
+    get all edges of a matrix in a release as {stix_id: (source_ref, relation, target_ref, digest)}
+
+    STIX relationships are keyed by their own id, the data has duplicate relationships
+    between the same objects and each keeps its own interval.
+    Besides them, the tactic and matrix memberships that db_init builds from
+    kill_chain_phases and tactic_refs are derived as 'in' edges, keyed by source|in|target.
+    Tactics share their short names across matrices, so this is done one matrix at a time.
+    """
+    edges = {}
+    tactics = {}
+    for obj in objects.values():
+        if obj['type'] == 'x-mitre-tactic':
+            tactics[obj.get('x_mitre_shortname')] = obj['id']
+
+    for obj in objects.values():
+        if obj['type'] == 'relationship':
+            edges[obj['id']] = (obj['source_ref'], obj['relationship_type'], obj['target_ref'], digest(obj))
+
+        elif obj['type'] == 'x-mitre-matrix':
+            for tactic_id in obj.get('tactic_refs', []):
+                edges[tactic_id + '|in|' + obj['id']] = (tactic_id, 'in', obj['id'], None)
+
+        elif obj['type'] == 'attack-pattern':
+            for phase in obj.get('kill_chain_phases', []):
+                tactic_id = tactics.get(phase['phase_name'])
+                if tactic_id is not None:
+                    edges[obj['id'] + '|in|' + tactic_id] = (obj['id'], 'in', tactic_id, None)
+
+    return {key: edge for key, edge in edges.items() if edge[0] in objects and edge[2] in objects}
+
+
+def open_versions():
+    cursor = graph.run(
+        'MATCH (o:stix_object)-[:version]->(v:stix_version) WHERE v.valid_to IS NULL '
+        'RETURN o.stix_id AS stix_id, v.digest AS digest'
+    )
+    return {record['stix_id']: record['digest'] for record in cursor}
+
+
+def open_edges():
+    cursor = graph.run(
+        'MATCH (s:stix_object)-[r]->(t:stix_object) WHERE r.valid_from IS NOT NULL AND r.valid_to IS NULL '
+        'RETURN r.stix_id AS stix_id, s.stix_id AS source, type(r) AS relation, t.stix_id AS target, r.digest AS digest'
+    )
+    return {
+        record['stix_id']: (record['source'], record['relation'], record['target'], record['digest'])
+        for record in cursor
+    }
+
+
+def store_release(tag, ordinal, commit):
+
+    print('INSERT RELEASE', tag, commit.hexsha)
+    objects = {}
+    edges = {}
+    for matrix_objects in read_release(commit).values():
+        objects.update(matrix_objects)
+        edges.update(release_edges(matrix_objects))
+
+    # close and open object versions whose content changed
+    versions = open_versions()
+    anchors = {}
+    for stix_id, obj in objects.items():
+        if obj['type'] == 'relationship':
+            continue
+
+        content = digest(obj)
+        if versions.get(stix_id) == content:
+            continue
+
+        sdo = SDO_CLASSES[obj['type']](obj)
+        sdo.mitre_id = get_attack_id(obj)
+        if sdo.mitre_id is None and obj['type'] != 'x-mitre-matrix':
+            print('WARNING no ATT&CK ID', stix_id)
+        anchor = Node('stix_object', stix_id=stix_id, type=sdo.type, mitre_id=sdo.mitre_id)
+        graph.merge(anchor, 'stix_object', 'stix_id')
+        anchors[stix_id] = anchor
+
+        if stix_id in versions:
+            print('UPDATE SDO', sdo.type, 'Name:', sdo.name)
+            graph.run(
+                'MATCH (:stix_object {stix_id: $stix_id})-[:version]->(v:stix_version) WHERE v.valid_to IS NULL '
+                'SET v.valid_to = $ordinal',
+                stix_id=stix_id, ordinal=ordinal
+            )
+        else:
+            print('INSERT SDO', sdo.type, 'Name:', sdo.name)
+
+        version = Node(
+            'stix_version',
+            valid_from=ordinal,
+            digest=content,
+            modified=obj.get('modified'),
+            **sdo.properties()
+        )
+        graph.create(Relationship(anchor, 'version', version))
+
+    for stix_id in versions.keys() - objects.keys():
+        print('DELETE SDO', stix_id)
+        graph.run(
+            'MATCH (:stix_object {stix_id: $stix_id})-[:version]->(v:stix_version) WHERE v.valid_to IS NULL '
+            'SET v.valid_to = $ordinal',
+            stix_id=stix_id, ordinal=ordinal
+        )
+
+    # same for the edges between the objects
+    current = open_edges()
+    changed = {key for key in edges.keys() & current.keys() if edges[key] != current[key]}
+    for key in (current.keys() - edges.keys()) | changed:
+        graph.run(
+            'MATCH (:stix_object {stix_id: $source})-[r]->() '
+            'WHERE r.stix_id = $stix_id AND r.valid_to IS NULL SET r.valid_to = $ordinal',
+            source=current[key][0], stix_id=key, ordinal=ordinal
+        )
+
+    for key in (edges.keys() - current.keys()) | changed:
+        source, relation, target, content = edges[key]
+        print('INSERT SRO', source, relation, target)
+        n1 = anchors.get(source) or graph.nodes.match('stix_object', stix_id=source).first()
+        n2 = anchors.get(target) or graph.nodes.match('stix_object', stix_id=target).first()
+        graph.create(Relationship(n1, relation, n2, stix_id=key, valid_from=ordinal, digest=content))
+
+    graph.create(Node(
+        'release',
+        tag=tag,
+        ordinal=ordinal,
+        commit=commit.hexsha,
+        date=commit.committed_datetime.isoformat()
+    ))
+
+
+def list_releases(repo, revs=None):
+    """the releases to import by commit date: all tags, or the given tags/commits"""
+    if revs is None:
+        releases = [(tag.name, tag.commit) for tag in repo.tags]
+    else:
+        releases = [(rev, repo.commit(rev)) for rev in revs]
+    return sorted(releases, key=lambda release: release[1].committed_datetime)
+
+
+def history_init(working_dir, revs=None):
+    """
+    version 1.3 import every release of the cti repository as validity intervals
+
+    Releases that are already in the graph are skipped,
+    so this can be run again after db_update() to append the new releases.
+    Ordinals follow the release order, so a release older than the last imported one
+    can not be appended and is refused; clear the history and import again instead.
+    """
+    repo = git.Repo(working_dir + "cti")
+    create_history_indexes()
+
+    imported = {}
+    last_date = None
+    for record in graph.run('MATCH (r:release) RETURN r.tag AS tag, r.ordinal AS ordinal, r.date AS date'):
+        imported[record['tag']] = record['ordinal']
+        date = datetime.fromisoformat(record['date'])
+        if last_date is None or date > last_date:
+            last_date = date
+    ordinal = max(imported.values(), default=-1)
+
+    releases = [(tag, commit) for tag, commit in list_releases(repo, revs) if tag not in imported]
+    older = [tag for tag, commit in releases if last_date is not None and commit.committed_datetime < last_date]
+    if older:
+        raise ValueError('releases older than the last imported one: ' + ', '.join(older))
+
+    for tag, commit in releases:
+        ordinal += 1
+        store_release(tag, ordinal, commit)
+    print("history up to date.")
+
+
+def get_release_ordinal(src, release):
+    record = src.run('MATCH (r:release {tag: $tag}) RETURN r.ordinal AS ordinal', tag=release).evaluate()
+    if record is None:
+        raise ValueError('release not imported: ' + release)
+    return record
+
+
+def get_object_as_of(src, typ, mitre_id, release):
+    """
+    Get an object as it was in a release
+
+    get_object_as_of(graph, 'group', 'G0016', 'v6.0')
+
+    ATT&CK IDs are not unique across types (mitigations reuse technique IDs),
+    so the object is looked up by its type (technique, group, software, ...) and ID
+    through the stix_object(type, mitre_id) and release(tag) indexes,
+    then the one version whose interval contains the release is picked.
+    """
+    ordinal = get_release_ordinal(src, release)
+    return src.run(
+        'MATCH (:stix_object {type: $type, mitre_id: $mitre_id})-[:version]->(v:stix_version) '
+        'WHERE v.valid_from <= $ordinal AND (v.valid_to IS NULL OR v.valid_to > $ordinal) '
+        'RETURN v',
+        type=typ, mitre_id=mitre_id, ordinal=ordinal
+    ).evaluate()
+
+
+def get_relations_as_of(src, typ, mitre_id, release, direction='both'):
+    """
+    Get the relations of an object in a release
+
+    get_relations_as_of(graph, 'technique', 'T1085', 'v6.0')
+
+    STIX uses and mitigates relationships point into techniques,
+    so direction is 'out', 'in' or 'both' (the default).
+    Returns (direction, relation, type, ATT&CK ID, version) tuples of the other objects.
+    """
+    patterns = {
+        'out': '-[r]->',
+        'in': '<-[r]-'
+    }
+    if direction == 'both':
+        directions = ['out', 'in']
+    elif direction in patterns:
+        directions = [direction]
+    else:
+        raise ValueError('direction must be out, in or both: ' + direction)
+
+    ordinal = get_release_ordinal(src, release)
+    relations = []
+    for way in directions:
+        cursor = src.run(
+            'MATCH (:stix_object {type: $type, mitre_id: $mitre_id})' + patterns[way] +
+            '(t:stix_object)-[:version]->(v:stix_version) '
+            'WHERE type(r) <> "version" '
+            'AND r.valid_from <= $ordinal AND (r.valid_to IS NULL OR r.valid_to > $ordinal) '
+            'AND v.valid_from <= $ordinal AND (v.valid_to IS NULL OR v.valid_to > $ordinal) '
+            'RETURN type(r) AS relation, t.type AS type, t.mitre_id AS mitre_id, v AS version',
+            type=typ, mitre_id=mitre_id, ordinal=ordinal
+        )
+        relations.extend(
+            (way, record['relation'], record['type'], record['mitre_id'], record['version']) for record in cursor
+        )
+    return relations
@@ -1,5 +1,6 @@
-from stix2 import FileSystemSource
+from stix2 import FileSystemSource, MemorySource
 from cti_utils import *
+from db_feed import write_change_feed
 from cti_objs.mitre_objs import *
 from py2neo import Graph
 from time import time
@@ -14,11 +15,14 @@ graph = Graph(
 def from_matrix_to_graph(matrix_path):
     
     """
-    version 1.2
+    version 1.3
+    
+    The matrix is parsed from disk once into a MemorySource, which is returned
+    so the rest of the import (the change feed) does not parse it again.
     """
     
     # initialise the matrix
-    fs = FileSystemSource(matrix_path)
+    fs = MemorySource(stix_data=FileSystemSource(matrix_path).query(), allow_custom=True)
     matrix = Matrix(obj_dict=None)
     matrix_name = matrix_path.split('/')[2].split('-')[0]
     
@@ -71,12 +75,14 @@ def from_matrix_to_graph(matrix_path):
             for m in mitigation:
                 m_obj = Mitigation(obj_dict=m, used_by=tech)
                 m_obj.store(graph, te_node)
+    
+    return fs
 
 
 def db_init():
     
     t1 = time()
-    from_matrix_to_graph('./cti/enterprise-attack')
-    from_matrix_to_graph('./cti/pre-attack')
-    from_matrix_to_graph('./cti/mobile-attack')
+    matrix_paths = ['./cti/enterprise-attack', './cti/pre-attack', './cti/mobile-attack']
+    sources = [from_matrix_to_graph(matrix_path) for matrix_path in matrix_paths]
+    write_change_feed(graph, sources)
     print(time()-t1, 'seconds')
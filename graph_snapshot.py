@@ -0,0 +1,271 @@
+from collections import deque
+import mmap
+import struct
+import numpy as np
+
+'''
+Read-only CSR snapshot of the ATT&CK graph for offline traversal analytics.
+
+export_snapshot(graph, './attck.csr')
+
+snapshot = GraphSnapshot('./attck.csr')
+snapshot.k_hop(snapshot.node_id('Rundll32', 'technique'), 2)
+
+The file is a little-endian header followed by 8-byte aligned little-endian arrays, loaded as zero-copy NumPy views
+over a read-only mmap, so every process opening the same file shares its pages:
+
+    offsets         int64[nodes + 1]    the edges of node i are offsets[i]:offsets[i + 1]
+    neighbors       int32[edges]        the target node of each edge
+    edge_types      int32[edges]        string id of the relationship type
+    labels          int32[nodes]        string id of the node label
+    names           int32[nodes]        string id of the node name, -1 if none
+    mitre_ids       int32[nodes]        string id of the ATT&CK ID, -1 if none
+    string_offsets  int64[strings + 1]  string i is string_data[string_offsets[i]:string_offsets[i + 1]]
+    string_data     uint8[bytes]        utf-8 encoded strings
+'''
+
+MAGIC = b'ATTCKCSR'
+VERSION = 1
+
+LABELS = ['matrix', 'tactic', 'technique', 'software', 'group', 'mitigation']
+
+# little-endian like the header, so snapshots are portable across hosts
+SECTIONS = [
+    ('offsets', '<i8'),
+    ('neighbors', '<i4'),
+    ('edge_types', '<i4'),
+    ('labels', '<i4'),
+    ('names', '<i4'),
+    ('mitre_ids', '<i4'),
+    ('string_offsets', '<i8'),
+    ('string_data', 'u1')
+]
+
+# magic, version, then (byte offset, length) of each section
+HEADER = struct.Struct('<8sII' + 'qq' * len(SECTIONS))
+
+
+def _align(size):
+    return (size + 7) & ~7
+
+
+def export_snapshot(graph, path):
+    """
+    version 1.3 write the graph populated by from_matrix_to_graph as a CSR snapshot
+
+    Only the Matrix/Tactic/Technique/Software/Group/Mitigation nodes and the
+    relationships between them are exported, in both directions as they are stored.
+    """
+    strings = {}
+
+    def string_id(value):
+        if value is None:
+            return -1
+        return strings.setdefault(value, len(strings))
+
+    nodes = {}
+    labels, names, mitre_ids = [], [], []
+    cursor = graph.run(
+        'MATCH (n) WHERE any(label IN labels(n) WHERE label IN $labels) '
+        'RETURN id(n) AS id, [label IN labels(n) WHERE label IN $labels][0] AS label, '
+        'n.name AS name, n.mitre_id AS mitre_id ORDER BY label, name',
+        labels=LABELS
+    )
+    for record in cursor:
+        nodes[record['id']] = len(nodes)
+        labels.append(string_id(record['label']))
+        names.append(string_id(record['name']))
+        mitre_ids.append(string_id(record['mitre_id']))
+
+    sources, targets, edge_types = [], [], []
+    cursor = graph.run(
+        'MATCH (a)-[r]->(b) WHERE id(a) IN $ids AND id(b) IN $ids '
+        'RETURN id(a) AS source, type(r) AS relation, id(b) AS target',
+        ids=list(nodes.keys())
+    )
+    for record in cursor:
+        sources.append(nodes[record['source']])
+        targets.append(nodes[record['target']])
+        edge_types.append(string_id(record['relation']))
+
+    sources = np.array(sources, dtype=np.int64)
+    targets = np.array(targets, dtype=np.int32)
+    edge_types = np.array(edge_types, dtype=np.int32)
+    order = np.lexsort((targets, sources))
+
+    offsets = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=len(nodes)), out=offsets[1:])
+
+    encoded = [s.encode('utf-8') for s in strings.keys()]
+    string_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.array([len(s) for s in encoded], dtype=np.int64), out=string_offsets[1:])
+
+    arrays = {
+        'offsets': offsets,
+        'neighbors': targets[order],
+        'edge_types': edge_types[order],
+        'labels': np.array(labels, dtype=np.int32),
+        'names': np.array(names, dtype=np.int32),
+        'mitre_ids': np.array(mitre_ids, dtype=np.int32),
+        'string_offsets': string_offsets,
+        'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    }
+
+    layout = []
+    position = _align(HEADER.size)
+    for name, dtype in SECTIONS:
+        data = arrays[name].astype(dtype, copy=False)
+        arrays[name] = data
+        layout.extend([position, len(data)])
+        position = _align(position + data.nbytes)
+
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, *layout))
+        for (name, _), offset in zip(SECTIONS, layout[::2]):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(arrays[name].tobytes())
+
+    print('EXPORT SNAPSHOT', path, len(nodes), 'nodes', len(order), 'edges')
+
+
+class GraphSnapshot:
+    """
+    Opens a CSR snapshot written by export_snapshot.
+    Nodes are identified by their index, the arrays are read-only views over the mmap.
+    """
+
+    def __init__(self, path):
+
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, *layout = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise ValueError('not an ATT&CK CSR snapshot: ' + path)
+
+        for (name, dtype), offset, count in zip(SECTIONS, layout[::2], layout[1::2]):
+            setattr(self, name, np.frombuffer(self._mm, dtype=dtype, count=count, offset=offset))
+
+        self._ids = None
+        self.closed = False
+
+    def close(self):
+        """
+        release the arrays and unmap the file, calling it again does nothing
+
+        While a caller still holds one of the views returned by neighbors_of or the arrays,
+        the mapping can not be unmapped yet: closed is set all the same and the mapping
+        stays open until the last view is garbage collected.
+        """
+        if self.closed:
+            return
+        self.closed = True
+        for name, _ in SECTIONS:
+            delattr(self, name)
+        try:
+            self._mm.close()
+        except BufferError:
+            print('WARNING snapshot views still in use, the mapping stays open until they are released')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def node_count(self):
+        return len(self.offsets) - 1
+
+    @property
+    def edge_count(self):
+        return len(self.neighbors)
+
+    def string(self, string_id):
+        if string_id < 0:
+            return None
+        return self.string_data[self.string_offsets[string_id]:self.string_offsets[string_id + 1]].tobytes().decode('utf-8')
+
+    def string_id(self, value):
+        """reverse lookup of the string table, built on first use"""
+        if self._ids is None:
+            self._ids = {self.string(i): i for i in range(len(self.string_offsets) - 1)}
+        return self._ids.get(value, -1)
+
+    def node_id(self, name, label=None):
+        """the index of a node by its name or its ATT&CK ID, None if there is no such node"""
+        value = self.string_id(name)
+        if value < 0:
+            return None
+        matches = np.flatnonzero((self.names == value) | (self.mitre_ids == value))
+        if label is not None:
+            matches = matches[self.labels[matches] == self.string_id(label)]
+        return int(matches[0]) if len(matches) else None
+
+    def node(self, node_id):
+        return {
+            'label': self.string(self.labels[node_id]),
+            'name': self.string(self.names[node_id]),
+            'mitre_id': self.string(self.mitre_ids[node_id])
+        }
+
+    def neighbors_of(self, node_id, edge_types=None):
+        """
+        the neighbors of a node, optionally only through the given relationship types
+
+        Without edge_types this is a read-only view of the mmap, copy it to keep it after close().
+        """
+        begin, end = self.offsets[node_id], self.offsets[node_id + 1]
+        neighbors = self.neighbors[begin:end]
+        if edge_types is not None:
+            neighbors = neighbors[np.isin(self.edge_types[begin:end], self._type_ids(edge_types))]
+        return neighbors
+
+    def _type_ids(self, edge_types):
+        return np.array([self.string_id(edge_type) for edge_type in edge_types], dtype=np.int32)
+
+    def bfs(self, start, edge_types=None, max_depth=None):
+        """
+        breadth first search from a node, level by level
+
+        Returns the hop distance of every node, -1 for the unreachable ones.
+        """
+        distance = np.full(self.node_count, -1, dtype=np.int32)
+        distance[start] = 0
+        frontier = np.array([start], dtype=np.int64)
+        depth = 0
+
+        while len(frontier) and (max_depth is None or depth < max_depth):
+            reached = np.concatenate([self.neighbors_of(node, edge_types) for node in frontier])
+            reached = np.unique(reached)
+            frontier = reached[distance[reached] < 0]
+            depth += 1
+            distance[frontier] = depth
+
+        return distance
+
+    def k_hop(self, start, k, edge_types=None):
+        """the nodes at most k hops away from a node, the node itself excluded"""
+        distance = self.bfs(start, edge_types, k)
+        return np.flatnonzero(distance > 0)
+
+    def shortest_path(self, source, target, edge_types=None):
+        """the nodes of a shortest path from source to target, None if target is unreachable"""
+        parent = np.full(self.node_count, -1, dtype=np.int64)
+        parent[source] = source
+        queue = deque([source])
+
+        while queue:
+            node = queue.popleft()
+            if node == target:
+                path = [target]
+                while path[-1] != source:
+                    path.append(int(parent[path[-1]]))
+                return path[::-1]
+            for neighbor in self.neighbors_of(node, edge_types):
+                if parent[neighbor] < 0:
+                    parent[neighbor] = node
+                    queue.append(int(neighbor))
+
+        return None
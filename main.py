@@ -1,6 +1,8 @@
 import sys
-from db_init import db_init
+from db_init import db_init, graph
 from db_update import db_update
+from db_history import history_init
+from graph_snapshot import export_snapshot
 
 if __name__ == "__main__":
     
@@ -13,6 +15,12 @@ if __name__ == "__main__":
         
     if operation == "init":
         db_init()
+    
+    elif operation == "history":
+        history_init(working_dir, sys.argv[2:] or None)
+    
+    elif operation == "snapshot":
+        export_snapshot(graph, sys.argv[2] if len(sys.argv) > 2 else working_dir + "attck.csr")
         
     else:
         if operation != "update":